@@ -1,35 +1,84 @@
 import sys
 import logging
+import asyncio
 import anthropic
+import httpx
 import csv
-import time
-import json
-import multiprocessing
+import hashlib
+import sqlite3
+import orjson
 import os
+import random
+from collections import namedtuple
+from functools import lru_cache
 import gspread
+from aiolimiter import AsyncLimiter
 from google.oauth2.service_account import Credentials
 
 
-def setup_google_sheet(credentials_file, spreadsheet_id, sheet_name):
+@lru_cache(maxsize=None)
+def get_google_client(credentials_file):
     """
-    Sets up and returns a Google Sheet worksheet.
+    Authorizes and returns a gspread client, cached per credentials file.
 
     Args:
         credentials_file (str): Path to the service account credentials JSON file.
-        spreadsheet_id (str): ID of the Google Spreadsheet.
-        sheet_name (str): Name of the worksheet within the spreadsheet.
 
     Returns:
-        gspread.models.Worksheet: The specified worksheet object.
+        gspread.Client: The authorized client.
     """
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive"
     ]
     creds = Credentials.from_service_account_file(credentials_file, scopes=scopes)
-    client = gspread.authorize(creds)
-    sheet = client.open_by_key(spreadsheet_id).worksheet(sheet_name)
-    return sheet
+    return gspread.authorize(creds)
+
+# A learning objective to map, with its inputs parsed and as compact JSON strings.
+# The JSON strings are used both in the prompt and in the output row.
+Objective = namedtuple(
+    "Objective",
+    ["learning_objective", "substandards", "key_phrases", "substandards_json", "key_phrases_json"]
+)
+
+def to_json(value):
+    """
+    Serializes a value to the compact JSON form used in prompts and output rows.
+
+    Args:
+        value: JSON-serializable value.
+
+    Returns:
+        str: Compact JSON string with non-ASCII characters preserved.
+    """
+    return orjson.dumps(value).decode()
+
+def is_string_list(value):
+    """
+    Checks that a parsed input cell is a list of strings.
+
+    Args:
+        value: Value decoded from a Substandards or Key Phrases cell.
+
+    Returns:
+        bool: True if the value is a list whose items are all strings.
+    """
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+def setup_google_sheets(credentials_file, spreadsheet_id, *sheet_names):
+    """
+    Sets up and returns worksheets from a single Google Spreadsheet.
+
+    Args:
+        credentials_file (str): Path to the service account credentials JSON file.
+        spreadsheet_id (str): ID of the Google Spreadsheet.
+        *sheet_names (str): Names of the worksheets within the spreadsheet.
+
+    Returns:
+        list: The specified gspread.models.Worksheet objects, in the order requested.
+    """
+    spreadsheet = get_google_client(credentials_file).open_by_key(spreadsheet_id)
+    return [spreadsheet.worksheet(sheet_name) for sheet_name in sheet_names]
 
 # Define the schema for the Anthropic API tool use
 schema = {
@@ -62,6 +111,25 @@ schema = {
     }
 }
 
+# Define the schema used when several objectives are packed into one request
+multi_objective_schema = {
+    "name": "getObjectivesSubstandardKeyPhrases",
+    "description": "Map key phrases to substandards for each objective and return the mappings",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "mappings": {
+                "type": "object",
+                "description": "A mapping of each objective id to its scratchpad and substandards mapping",
+                "additionalProperties": schema["input_schema"]
+            }
+        },
+        "required": [
+            "mappings"
+        ]
+    }
+}
+
 # Define the user prompt for mapping key phrases to substandards
 user_prompt = """
 You will be provided with two lists:
@@ -100,6 +168,84 @@ Remember:
 Begin your mapping process now.
 """
 
+# Define the instructions that follow the lists in user_prompt, reused for packed requests
+user_prompt_instructions = user_prompt.split("</key_phrases>\n", 1)[1]
+
+# Define the user prompt used when several objectives are packed into one request
+multi_objective_prompt = """
+You will be provided with several objectives. Each objective is enclosed in <objective id="..."> tags and contains its own two lists of substandards and key phrases:
+
+{OBJECTIVES}
+Map the key phrases of each objective to that objective's substandards only, following the instructions below separately for each objective. Provide your response as a "mappings" object where each objective id is a key, and the value is that objective's JSON object with its "scratchpad" and "substandards" mapping. Every objective id MUST be included.
+{INSTRUCTIONS}"""
+
+# Define each objective's lists in a packed request
+objective_prompt_inputs = """<objective id="{OBJECTIVE_ID}">
+1. Substandards:
+<substandards>
+{SUBSTANDARDS}
+</substandards>
+
+2. Key Phrases:
+<key_phrases>
+{KEY_PHRASES}
+</key_phrases>
+</objective>
+"""
+
+def split_prompt_template(template, *placeholders):
+    """
+    Splits a prompt template into the literal text around its placeholders.
+
+    Args:
+        template (str): Prompt template containing each {PLACEHOLDER} once.
+        *placeholders (str): Placeholder names in the order they appear in the template.
+
+    Returns:
+        list: The literal text before, between and after the placeholders.
+    """
+    parts = []
+    rest = template
+    for placeholder in placeholders:
+        part, rest = rest.split("{" + placeholder + "}", 1)
+        parts.append(part)
+    parts.append(rest)
+    return parts
+
+# Split the templates once so rendering them is plain concatenation
+user_prompt_parts = split_prompt_template(user_prompt, "SUBSTANDARDS", "KEY_PHRASES")
+multi_objective_prompt_parts = split_prompt_template(multi_objective_prompt, "OBJECTIVES", "INSTRUCTIONS")
+objective_prompt_inputs_parts = split_prompt_template(
+    objective_prompt_inputs, "OBJECTIVE_ID", "SUBSTANDARDS", "KEY_PHRASES"
+)
+
+# Input Sheet range holding the Learning Objective, Substandards and Key Phrases columns
+INPUT_SHEET_RANGE = "A2:C"
+
+# Number of rows written to the output CSV between flushes
+CSV_FLUSH_INTERVAL = 10
+
+# Number of completed rows collected before they are appended to the Output Sheet
+SHEET_APPEND_INTERVAL = 50
+
+# Upper bound in seconds for exponential backoff between retries
+MAX_RETRY_DELAY = 30
+
+# Output token budget: a base allowance per objective for the scratchpad and JSON
+# structure, plus an allowance per key phrase, capped at the original fixed limit
+MAX_OUTPUT_TOKENS = 8000
+BASE_OUTPUT_TOKENS = 700
+OUTPUT_TOKENS_PER_KEY_PHRASE = 30
+
+# SDK retries for Message Batch calls, which are not rate limited by get_mapping
+BATCH_MAX_RETRIES = 5
+
+# Maximum number of requests the Message Batches API accepts in one batch
+MAX_BATCH_REQUESTS = 10000
+
+# Client error status codes worth retrying: request timeout, conflict and rate limit
+RETRYABLE_CLIENT_STATUS_CODES = {408, 409, 429}
+
 def analyze_output_dict(output):
     """
     Analyzes a mapping output dictionary to count items and check uniqueness.
@@ -108,132 +254,688 @@ def analyze_output_dict(output):
         output (dict): Dictionary mapping substandards to key phrases
         
     Returns:
-        tuple: (total count, uniqueness boolean)
+        tuple: (total count, whether every key phrase is mapped only once)
     """
     total = 0
-    
-    # Count items
-    for value in output.values():
-        if isinstance(value, list):
-            total += len(value)
-
-    # Check uniqueness
-    seen_values = set()
+    seen_phrases = set()
     is_unique = True
+
+    # Count items and check uniqueness in a single pass
     for value in output.values():
-        hashable_value = tuple(value) if isinstance(value, list) else value
-        if hashable_value in seen_values:
-            is_unique = False
-            break
-        seen_values.add(hashable_value)
+        if not isinstance(value, list):
+            continue
+        for phrase in value:
+            total += 1
+            if phrase in seen_phrases:
+                is_unique = False
+            seen_phrases.add(phrase)
     
     return total, is_unique
 
-def get_mapping(event, substandards, key_phrases, max_retries=5):
+def estimate_max_tokens(objective_group):
     """
-    Communicates with the Anthropic API to map key phrases to substandards.
+    Estimates the output tokens needed to map a group of objectives.
+
+    A tighter max_tokens reserves less of the output token rate limit per request.
 
     Args:
-        event (dict): Event dictionary containing configuration like API keys.
-        substandards (list): List of substandards.
-        key_phrases (list): List of key phrases.
-        max_retries (int, optional): Maximum number of retry attempts. Defaults to 5.
+        objective_group (dict): Objective id to Objective.
 
     Returns:
-        dict or None: Mapping of substandards to key phrases along with scratchpad or None if failed.
+        int: The max_tokens value for the request.
     """
-    claude_api_key = event.get("claude_api_key")
+    estimate = sum(
+        BASE_OUTPUT_TOKENS + OUTPUT_TOKENS_PER_KEY_PHRASE * len(objective.key_phrases)
+        for objective in objective_group.values()
+    )
+    return min(MAX_OUTPUT_TOKENS, estimate)
 
-    claude_client = anthropic.Anthropic(api_key=claude_api_key)
-    prompt = user_prompt
-    user_message = prompt.format(
-        SUBSTANDARDS=substandards,
-        KEY_PHRASES=key_phrases
+def render_user_prompt(objective_group):
+    """
+    Renders the user prompt for a group of objectives.
+
+    Args:
+        objective_group (dict): Objective id to Objective.
+
+    Returns:
+        str: user_prompt for a single objective, or multi_objective_prompt for larger groups.
+    """
+    if len(objective_group) == 1:
+        objective, = objective_group.values()
+        before_substandards, before_key_phrases, after_key_phrases = user_prompt_parts
+        return (
+            before_substandards + objective.substandards_json
+            + before_key_phrases + objective.key_phrases_json
+            + after_key_phrases
+        )
+
+    before_id, before_substandards, before_key_phrases, after_key_phrases = objective_prompt_inputs_parts
+    objectives = "".join(
+        before_id + objective_id
+        + before_substandards + objective.substandards_json
+        + before_key_phrases + objective.key_phrases_json
+        + after_key_phrases
+        for objective_id, objective in objective_group.items()
     )
+    before_objectives, before_instructions, after_instructions = multi_objective_prompt_parts
+    return before_objectives + objectives + before_instructions + user_prompt_instructions + after_instructions
+
+def build_mapping_request(event, objective_group, max_tokens=None):
+    """
+    Builds the Anthropic Messages API parameters for mapping a group of objectives.
+
+    A single objective uses the original prompt and schema; larger groups are packed
+    into one request and answered with a mapping per objective id.
+
+    Args:
+        event (dict): Event dictionary containing configuration like model and temperature.
+        objective_group (dict): Objective id to Objective.
+        max_tokens (int, optional): Output token limit. Defaults to estimate_max_tokens.
+
+    Returns:
+        dict: Keyword arguments for messages.create, also used as batch request params.
+    """
+    user_message = render_user_prompt(objective_group)
+    return {
+        "model": event.get("model"),
+        "tools": [schema if len(objective_group) == 1 else multi_objective_schema],
+        "temperature": event.get("temperature"),
+        "messages": [{"role": "user", "content": user_message}],
+        "max_tokens": max_tokens or estimate_max_tokens(objective_group),
+    }
+
+def extract_tool_input(message):
+    """
+    Extracts the tool use input from a Claude message.
+
+    Args:
+        message (anthropic.types.Message): Message returned by the Anthropic API.
+
+    Returns:
+        dict or None: The tool use input or None if the message has no tool use block.
+    """
+    for content in message.content:
+        if content.type == "tool_use":
+            return content.input
+    logging.error("No tool use response found in Claude's output")
+    return None
+
+def split_mapping_results(objective_group, tool_input):
+    """
+    Splits a tool use input into the mapping result of each objective in the group.
+
+    Args:
+        objective_group (dict): Objective id to Objective.
+        tool_input (dict): Tool use input returned by Claude.
+
+    Returns:
+        dict or None: Objective id to mapping result or None if the response is malformed.
+    """
+    if len(objective_group) == 1:
+        objective_id, = objective_group
+        return {objective_id: tool_input}
+
+    mappings = tool_input.get("mappings")
+    if not isinstance(mappings, dict):
+        logging.error(f"Unexpected format for 'mappings' in mapping result: {mappings}")
+        return None
+    return mappings
+
+def get_retry_delay(error, retry_count):
+    """
+    Determines how long to wait before retrying a failed request.
+
+    Args:
+        error (Exception): The error raised by the failed attempt.
+        retry_count (int): Zero-based index of the attempt that failed.
+
+    Returns:
+        float: Number of seconds to wait, preferring the API's retry-after header and
+            otherwise backing off exponentially with jitter.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after) + random.random()
+    except (TypeError, ValueError):
+        return min(2 ** retry_count + random.random(), MAX_RETRY_DELAY)
+
+async def get_mapping(claude_client, rate_limiter, request_slots, event, objective_group, max_retries=5):
+    """
+    Communicates with the Anthropic API to map key phrases to substandards for a group of objectives.
+
+    Args:
+        claude_client (anthropic.AsyncAnthropic): Shared async Anthropic client.
+        rate_limiter (aiolimiter.AsyncLimiter): Shared limiter enforcing requests per minute.
+        request_slots (asyncio.Semaphore): Shared semaphore capping requests in flight.
+        event (dict): Event dictionary containing configuration like model and temperature.
+        objective_group (dict): Objective id to Objective.
+        max_retries (int, optional): Maximum number of retry attempts. Defaults to 5.
+
+    Returns:
+        tuple: (objective id to mapping of substandards to key phrases along with
+            scratchpad, or None if failed; the response's stop reason)
+    """
+    request = build_mapping_request(event, objective_group)
 
     for retry_count in range(max_retries):
         try:
-            response = claude_client.messages.create(
-                model=event.get("model"),
-                tools=[schema],
-                temperature=event.get("temperature"),
-                messages=[{"role": "user", "content": user_message}],
-                max_tokens=8000,
-            )
+            async with request_slots, rate_limiter:
+                response = await claude_client.messages.create(**request)
+
+            # Resend with the full budget if the estimate was too small to finish the answer.
+            # This happens at most once and is part of the same attempt, so it does not use up a retry
+            if response.stop_reason == "max_tokens" and request["max_tokens"] < MAX_OUTPUT_TOKENS:
+                logging.warning(f"Response ran out of output tokens, resending with {MAX_OUTPUT_TOKENS}")
+                request["max_tokens"] = MAX_OUTPUT_TOKENS
+                async with request_slots, rate_limiter:
+                    response = await claude_client.messages.create(**request)
             
-            for content in response.content:
-                if content.type == "tool_use":
-                    logging.info("Successfully got mapping result from Anthropic API")
-                    return content.input
-            logging.error("No tool use response found in Claude's output")
-            return None
+            tool_input = extract_tool_input(response)
+            if tool_input is None:
+                return None, response.stop_reason
+            logging.info("Successfully got mapping result from Anthropic API")
+            return split_mapping_results(objective_group, tool_input), response.stop_reason
             
+        except anthropic.APIStatusError as e:
+            logging.error(f"Attempt {retry_count + 1} failed with status {e.status_code}: {str(e)}")
+            # Client errors other than rate limits and timeouts will fail again on retry
+            if e.status_code < 500 and e.status_code not in RETRYABLE_CLIENT_STATUS_CODES:
+                logging.error("Request was rejected by the Anthropic API, not retrying")
+                return None, None
+            error = e
+
         except Exception as e:
             logging.error(f"Attempt {retry_count + 1} failed: {str(e)}")
-            if retry_count < max_retries - 1:
-                logging.info("Retrying after a short delay...")
-                time.sleep(2)
-            continue
+            error = e
+
+        if retry_count < max_retries - 1:
+            delay = get_retry_delay(error, retry_count)
+            logging.info(f"Retrying after {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
     
     logging.error(f"Failed to process objective after {max_retries} attempts")
+    return None, None
+
+async def write_mapping_result(row_queue, objective, mapping_result):
+    """
+    Validates a mapping result and queues it as a row for the output CSV.
+
+    Args:
+        row_queue (asyncio.Queue): Queue consumed by the CSV writer task.
+        objective (Objective): Learning objective with its substandards and key phrases.
+        mapping_result (dict): Tool use input returned by Claude.
+
+    Returns:
+        bool: True if the row was queued, False if the mapping result was malformed.
+    """
+    logging.debug(f"Raw Mapping Result: {mapping_result}")
+
+    # Extract 'scratchpad' and 'substandards' mapping
+    scratchpad = mapping_result.get("scratchpad", "")
+    substandards_mapping = mapping_result.get("substandards", {})
+
+    if not isinstance(substandards_mapping, dict):
+        logging.error(f"Unexpected format for 'substandards' in mapping result: {substandards_mapping}")
+        logging.debug(f"Full Mapping Result: {mapping_result}")
+        return False
+    
+    total_count, is_unique = analyze_output_dict(substandards_mapping)
+    # Row values in the same order as the output CSV headers
+    row_data = (
+        objective.learning_objective,
+        objective.substandards_json,
+        objective.key_phrases_json,
+        scratchpad,
+        to_json(substandards_mapping),
+        len(objective.key_phrases),
+        total_count,
+        "Yes" if is_unique else "No"
+    )
+            
+    await row_queue.put(row_data)
+    return True
+
+def open_mapping_cache(cache_path):
+    """
+    Opens the persistent mapping cache, creating it if needed.
+
+    Args:
+        cache_path (str): Path to the SQLite cache file.
+
+    Returns:
+        sqlite3.Connection: Connection to the cache database.
+    """
+    cache = sqlite3.connect(cache_path)
+    cache.execute("PRAGMA journal_mode=WAL")
+    cache.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, json_result TEXT)")
+    cache.commit()
+    return cache
+
+def get_cache_key(event, objective):
+    """
+    Computes the cache key of an objective's mapping.
+
+    The key covers the model, temperature, prompts and tool schemas as well as the
+    inputs, so changing any of them does not return stale mappings. Input order does
+    not matter.
+
+    Args:
+        event (dict): Event dictionary containing configuration like model and temperature.
+        objective (Objective): Learning objective with its substandards and key phrases.
+
+    Returns:
+        str: Hex digest identifying the mapping.
+    """
+    return hashlib.blake2b(orjson.dumps([
+        event.get("model"),
+        event.get("temperature"),
+        user_prompt,
+        multi_objective_prompt,
+        schema,
+        multi_objective_schema,
+        sorted(objective.substandards),
+        sorted(objective.key_phrases)
+    ])).hexdigest()
+
+def get_cached_mapping(cache, cache_key):
+    """
+    Looks up a mapping result in the cache.
+
+    Args:
+        cache (sqlite3.Connection): Connection to the cache database.
+        cache_key (str): Key returned by get_cache_key.
+
+    Returns:
+        dict or None: The cached mapping result or None if it is not cached.
+    """
+    row = cache.execute("SELECT json_result FROM cache WHERE key = ?", (cache_key,)).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+def store_cached_mapping(cache, cache_key, mapping_result):
+    """
+    Stores a mapping result in the cache.
+
+    Args:
+        cache (sqlite3.Connection): Connection to the cache database.
+        cache_key (str): Key returned by get_cache_key.
+        mapping_result (dict): Tool use input returned by Claude.
+    """
+    cache.execute(
+        "INSERT OR REPLACE INTO cache (key, json_result) VALUES (?, ?)",
+        (cache_key, to_json(mapping_result))
+    )
+    cache.commit()
+
+def is_complete_mapping(objective, mapping_result):
+    """
+    Checks that a mapping result maps exactly the objective's key phrases, each once,
+    to the objective's own substandards.
+
+    Args:
+        objective (Objective): Learning objective with its substandards and key phrases.
+        mapping_result (dict): Tool use input returned by Claude.
+
+    Returns:
+        bool: True if the result is complete and safe to reuse from the cache.
+    """
+    substandards_mapping = mapping_result.get("substandards")
+    if not isinstance(substandards_mapping, dict):
+        return False
+    if not set(substandards_mapping) <= set(objective.substandards):
+        return False
+    if not all(is_string_list(phrases) for phrases in substandards_mapping.values()):
+        return False
+    mapped_phrases = [phrase for phrases in substandards_mapping.values() for phrase in phrases]
+    return sorted(mapped_phrases) == sorted(objective.key_phrases)
+
+def get_trivial_mapping(objective):
+    """
+    Returns the mapping for objectives that can be resolved without calling Claude.
+
+    Args:
+        objective (Objective): Learning objective with its substandards and key phrases.
+
+    Returns:
+        dict or None: Mapping result with scratchpad and substandards, or None if the
+            objective needs to be mapped by Claude.
+    """
+    if not objective.key_phrases:
+        return {
+            "scratchpad": "No key phrases to map.",
+            "substandards": {substandard: [] for substandard in objective.substandards}
+        }
+    if len(objective.substandards) == 1:
+        return {
+            "scratchpad": "Only one substandard, so all key phrases are mapped to it.",
+            "substandards": {objective.substandards[0]: list(objective.key_phrases)}
+        }
     return None
 
-def process_objective(event, output_path, headers, lock, learning_objective, substandards, key_phrases):
+async def write_group_results(event, row_queue, cache, objective_group, mapping_results, stop_reason):
     """
-    Processes a single objective by mapping its key phrases to substandards and writing the result.
+    Queues the mapping result of each objective in a group as a row for the output CSV.
 
     Args:
-        event (dict): Event dictionary containing configuration like API keys.
-        output_path (str): Path to the output CSV file.
-        headers (list): List of CSV headers.
-        lock (multiprocessing.Lock): Lock object for thread-safe file writing.
-        learning_objective (str): Learning objective.
-        substandards (list): Substandards associated with the learning objective.
-        key_phrases (list): Key phrases associated with the learning objective.
+        event (dict): Event dictionary containing configuration like model and temperature.
+        row_queue (asyncio.Queue): Queue consumed by the CSV writer task.
+        cache (sqlite3.Connection or None): Mapping cache to store valid results in.
+        objective_group (dict): Objective id to Objective.
+        mapping_results (dict): Objective id to tool use input returned by Claude.
+        stop_reason (str): Why Claude stopped generating the response.
     """
-    try:
-        logging.debug(f"Processing ID: {learning_objective}")
+    # A response cut off by max_tokens is written but never cached
+    cacheable = cache is not None and stop_reason != "max_tokens"
+    for objective_id, objective in objective_group.items():
+        try:
+            mapping_result = mapping_results.get(objective_id)
+            if not isinstance(mapping_result, dict):
+                logging.error(f"No valid mapping result for ID '{objective.learning_objective}'")
+                continue
 
-        mapping_result = get_mapping(event, substandards, key_phrases)
-        if mapping_result is None:
-            logging.error(f"No valid mapping result for ID '{learning_objective}'")
-            return
+            written = await write_mapping_result(row_queue, objective, mapping_result)
+            if written and cacheable and is_complete_mapping(objective, mapping_result):
+                store_cached_mapping(cache, get_cache_key(event, objective), mapping_result)
+        except Exception as e:
+            logging.error(f"Error processing mapping for ID '{objective.learning_objective}': {repr(e)}")
 
-        logging.debug(f"Raw Mapping Result: {mapping_result}")
+async def process_objective_group(claude_client, rate_limiter, request_slots, event, row_queue, cache, objective_group):
+    """
+    Processes a group of objectives with one request, mapping their key phrases to substandards and writing the results.
 
-        # Extract 'scratchpad' and 'substandards' mapping
-        scratchpad = mapping_result.get("scratchpad", "")
-        substandards_mapping = mapping_result.get("substandards", {})
+    Args:
+        claude_client (anthropic.AsyncAnthropic): Shared async Anthropic client.
+        rate_limiter (aiolimiter.AsyncLimiter): Shared limiter enforcing requests per minute.
+        request_slots (asyncio.Semaphore): Shared semaphore capping requests in flight.
+        event (dict): Event dictionary containing configuration like model and temperature.
+        row_queue (asyncio.Queue): Queue consumed by the CSV writer task.
+        cache (sqlite3.Connection or None): Mapping cache to store valid results in.
+        objective_group (dict): Objective id to Objective.
+    """
+    learning_objectives = [objective.learning_objective for objective in objective_group.values()]
+    try:
+        logging.debug(f"Processing IDs: {learning_objectives}")
 
-        if not isinstance(substandards_mapping, dict):
-            logging.error(f"Unexpected format for 'substandards' in mapping result: {substandards_mapping}")
-            logging.debug(f"Full Mapping Result: {mapping_result}")
+        mapping_results, stop_reason = await get_mapping(claude_client, rate_limiter, request_slots, event, objective_group)
+        if mapping_results is None:
+            logging.error(f"No valid mapping result for IDs {learning_objectives}")
             return
-        
-        total_count, is_unique = analyze_output_dict(substandards_mapping)
-        row_data = {
-            'Learning Objective': learning_objective,
-            'Substandards': json.dumps(substandards, ensure_ascii=False),
-            'Key Phrases': json.dumps(key_phrases, ensure_ascii=False),
-            'Thinking': scratchpad,
-            'Substandards to Key Phrases Mapping': json.dumps(substandards_mapping, ensure_ascii=False),
-            'Number of Key Phrases': len(key_phrases),  
-            "Total Key Phrases Mapped": total_count,
-            "All Key Phrases Mapped Unique?": "Yes" if is_unique else "No"
-        }
+
+        await write_group_results(event, row_queue, cache, objective_group, mapping_results, stop_reason)
                 
-        with lock:
+    except Exception as e:
+        logging.error(f"Error processing mapping for IDs {learning_objectives}: {repr(e)}")
+
+async def process_objectives_batch(claude_client, event, row_queue, cache, objective_groups):
+    """
+    Maps objective groups with a single Anthropic Message Batch and writes the results.
+
+    Batches are billed at half the price of interactive requests and are not subject
+    to per-minute rate limits, at the cost of results arriving asynchronously.
+
+    Args:
+        claude_client (anthropic.AsyncAnthropic): Shared async Anthropic client.
+        event (dict): Event dictionary containing configuration like model and temperature.
+        row_queue (asyncio.Queue): Queue consumed by the CSV writer task.
+        cache (sqlite3.Connection or None): Mapping cache to store valid results in.
+        objective_groups (list): List of at most MAX_BATCH_REQUESTS objective groups, one per request.
+    """
+    if not objective_groups:
+        return
+
+    groups_by_id = {
+        f"group-{idx}": objective_group for idx, objective_group in enumerate(objective_groups, start=1)
+    }
+    # Message Batches are still in beta in the pinned SDK, which adds the beta header itself
+    batches = claude_client.beta.messages.batches
+    try:
+        batch = await batches.create(
+            requests=[
+                {
+                    "custom_id": custom_id,
+                    # Batches have no per-minute token limit to save, and truncated batch
+                    # answers are not retried, so they keep the full output budget
+                    "params": build_mapping_request(event, objective_group, MAX_OUTPUT_TOKENS)
+                }
+                for custom_id, objective_group in groups_by_id.items()
+            ]
+        )
+    except Exception as e:
+        learning_objectives = [
+            objective.learning_objective
+            for objective_group in objective_groups
+            for objective in objective_group.values()
+        ]
+        logging.error(f"Failed to submit message batch for IDs {learning_objectives}: {str(e)}")
+        return
+    logging.info(f"Submitted message batch {batch.id} with {len(groups_by_id)} requests")
+
+    poll_interval = event.get("batch_poll_interval", 30)
+    try:
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await batches.retrieve(batch.id)
+            logging.info(f"Message batch {batch.id} status: {batch.processing_status}")
+
+        batch_results = await batches.results(batch.id)
+    except Exception as e:
+        logging.error(f"Failed to retrieve message batch {batch.id}, its results remain available by id: {str(e)}")
+        raise
+
+    async for entry in batch_results:
+        objective_group = groups_by_id[entry.custom_id]
+        learning_objectives = [objective.learning_objective for objective in objective_group.values()]
+        try:
+            if entry.result.type != "succeeded":
+                logging.error(f"Batch request for IDs {learning_objectives} {entry.result.type}")
+                continue
+
+            tool_input = extract_tool_input(entry.result.message)
+            mapping_results = None if tool_input is None else split_mapping_results(objective_group, tool_input)
+            if mapping_results is None:
+                logging.error(f"No valid mapping result for IDs {learning_objectives}")
+                continue
+
+            await write_group_results(
+                event, row_queue, cache, objective_group, mapping_results, entry.result.message.stop_reason
+            )
+        except Exception as e:
+            logging.error(f"Error processing mapping for IDs {learning_objectives}: {repr(e)}")
+
+async def append_to_sheet(output_sheet, rows):
+    """
+    Appends rows to the Output Sheet in a single request without blocking the event loop.
+
+    Args:
+        output_sheet (gspread.models.Worksheet): The Output Sheet.
+        rows (list): Rows to append, each in header order.
+    """
+    try:
+        await asyncio.to_thread(
+            output_sheet.append_rows,
+            rows,
+            value_input_option="RAW",
+            insert_data_option="INSERT_ROWS"
+        )
+        logging.info(f"Appended {len(rows)} mappings to the Output Sheet")
+    except Exception as e:
+        logging.error(f"Failed to write to Google Sheet: {str(e)}")
+
+async def write_rows(output_path, row_queue, output_sheet=None):
+    """
+    Appends rows from the queue to the output CSV until a None sentinel is received.
+
+    The file is opened once for the whole run and flushed every CSV_FLUSH_INTERVAL rows.
+    When an Output Sheet is given, rows are also appended to it every
+    SHEET_APPEND_INTERVAL rows, independently of the CSV.
+
+    Args:
+        output_path (str): Path to the output CSV file.
+        row_queue (asyncio.Queue): Queue of row tuples to write, in header order.
+        output_sheet (gspread.models.Worksheet, optional): The Output Sheet. Defaults to None.
+    """
+    outbox = []
+    with open(output_path, 'a', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        rows_written = 0
+        while (row_data := await row_queue.get()) is not None:
             try:
-                with open(output_path, 'a', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=headers)
-                    writer.writerow(row_data)
-                    # logging.info(f"Successfully wrote mapping for ID '{learning_objective}' to {output_path}")
+                writer.writerow(row_data)
+                rows_written += 1
+                if rows_written % CSV_FLUSH_INTERVAL == 0:
+                    csvfile.flush()
             except Exception as write_error:
-                logging.error(f"Error writing to file for ID '{learning_objective}': {str(write_error)}")
+                logging.error(f"Error writing to file for ID '{row_data[0]}': {str(write_error)}")
                 logging.error(f"Attempted to write to: {output_path}")
-                
-    except Exception as e:
-        logging.error(f"Error processing mapping for ID '{learning_objective}': {repr(e)}")
+
+            if output_sheet is not None:
+                outbox.append(list(row_data))
+                if len(outbox) >= SHEET_APPEND_INTERVAL:
+                    await append_to_sheet(output_sheet, outbox)
+                    outbox = []
+
+    if output_sheet is not None and outbox:
+        await append_to_sheet(output_sheet, outbox)
+
+async def map_objectives(claude_client, rate_limiter, request_slots, event, row_queue, cache, objectives):
+    """
+    Maps objectives with Claude and writes the results.
+
+    Objectives are grouped into requests of "objectives_per_request" objectives and sent
+    concurrently as interactive requests, or as Message Batches of up to
+    MAX_BATCH_REQUESTS requests when the event sets "batch_mode".
+
+    Args:
+        claude_client (anthropic.AsyncAnthropic): Shared async Anthropic client.
+        rate_limiter (aiolimiter.AsyncLimiter): Shared limiter enforcing requests per minute.
+        request_slots (asyncio.Semaphore): Shared semaphore capping requests in flight.
+        event (dict): Event dictionary containing configuration like model and temperature.
+        row_queue (asyncio.Queue): Queue consumed by the CSV writer task.
+        cache (sqlite3.Connection or None): Mapping cache to store valid results in.
+        objectives (list): List of Objective tuples.
+    """
+    # Learning objectives are free text, so objective ids are derived from their position
+    objectives_per_request = event.get("objectives_per_request", 1)
+    indexed_objectives = [
+        (f"objective-{idx}", objective) for idx, objective in enumerate(objectives, start=1)
+    ]
+    objective_groups = [
+        dict(indexed_objectives[start:start + objectives_per_request])
+        for start in range(0, len(indexed_objectives), objectives_per_request)
+    ]
+
+    if event.get("batch_mode"):
+        # A batch can take hours to finish, so its calls get extra SDK retries
+        batch_client = claude_client.with_options(max_retries=BATCH_MAX_RETRIES)
+        results = await asyncio.gather(*[
+            process_objectives_batch(
+                batch_client,
+                event,
+                row_queue,
+                cache,
+                objective_groups[start:start + MAX_BATCH_REQUESTS]
+            )
+            for start in range(0, len(objective_groups), MAX_BATCH_REQUESTS)
+        ], return_exceptions=True)
+    else:
+        # Retries are handled in get_mapping so they go through the shared rate limiter
+        interactive_client = claude_client.with_options(max_retries=0)
+        results = await asyncio.gather(*[
+            process_objective_group(
+                interactive_client,
+                rate_limiter,
+                request_slots,
+                event,
+                row_queue,
+                cache,
+                objective_group
+            )
+            for objective_group in objective_groups
+        ], return_exceptions=True)
+
+    # Surface any exceptions raised by individual tasks
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error(f"An error occurred during concurrent processing: {str(result)}")
+
+async def process_objectives(event, output_path, objectives, output_sheet=None, cache=None):
+    """
+    Maps all objectives using a single shared async Anthropic client.
+
+    Trivial and cached objectives are written directly; the rest are mapped with
+    map_objectives.
+
+    Args:
+        event (dict): Event dictionary containing configuration like API keys.
+        output_path (str): Path to the output CSV file.
+        objectives (list): List of Objective tuples.
+        output_sheet (gspread.models.Worksheet, optional): Sheet to append results to. Defaults to None.
+        cache (sqlite3.Connection, optional): Mapping cache to read and store results. Defaults to None.
+    """
+    # Objectives without key phrases or with a single substandard are mapped locally, and
+    # previously mapped inputs come from the cache. Repeats of an input within this run
+    # wait for its first occurrence to be mapped and cached.
+    resolved_mappings = []
+    objectives_to_map = []
+    duplicate_objectives = []
+    pending_cache_keys = set()
+    for objective in objectives:
+        mapping_result = get_trivial_mapping(objective)
+        if mapping_result is None and cache is not None:
+            cache_key = get_cache_key(event, objective)
+            mapping_result = get_cached_mapping(cache, cache_key)
+            if mapping_result is None:
+                if cache_key in pending_cache_keys:
+                    duplicate_objectives.append((objective, cache_key))
+                    continue
+                pending_cache_keys.add(cache_key)
+
+        if mapping_result is None:
+            objectives_to_map.append(objective)
+        else:
+            resolved_mappings.append((objective, mapping_result))
+    if resolved_mappings:
+        logging.info(f"Mapped {len(resolved_mappings)} objectives without calling Claude")
+
+    max_concurrent_requests = event.get("max_concurrent_requests", 10)
+    rate_limiter = AsyncLimiter(event.get("requests_per_minute", 40), 60)
+    request_slots = asyncio.Semaphore(max_concurrent_requests)
+    row_queue = asyncio.Queue()
+    writer_task = asyncio.create_task(write_rows(output_path, row_queue, output_sheet))
+
+    try:
+        for objective, mapping_result in resolved_mappings:
+            await write_mapping_result(row_queue, objective, mapping_result)
+
+        # One client and connection pool is shared by all requests, sized so every request
+        # slot can reuse a kept-alive connection
+        http_client = anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrent_requests,
+                max_keepalive_connections=max_concurrent_requests
+            )
+        )
+        async with anthropic.AsyncAnthropic(
+            api_key=event.get("claude_api_key"),
+            http_client=http_client
+        ) as claude_client:
+            await map_objectives(claude_client, rate_limiter, request_slots, event, row_queue, cache, objectives_to_map)
+
+            # Repeats are written from the cache, or mapped themselves if the first
+            # occurrence did not produce a complete mapping
+            unresolved_duplicates = []
+            for objective, cache_key in duplicate_objectives:
+                mapping_result = get_cached_mapping(cache, cache_key)
+                if mapping_result is None:
+                    unresolved_duplicates.append(objective)
+                    continue
+                await write_mapping_result(row_queue, objective, mapping_result)
+
+            await map_objectives(claude_client, rate_limiter, request_slots, event, row_queue, cache, unresolved_duplicates)
+    finally:
+        # Signal the writer that no more rows are coming and wait for it to drain the queue
+        await row_queue.put(None)
+        await writer_task
 
 def orchestrator(event):
     """
@@ -248,50 +950,47 @@ def orchestrator(event):
     google_sheet_info = event.get("google_sheet")
     if google_sheet_info:
         logging.info("Setting up Google Sheets")
-        # Setup Input Sheet
-        input_sheet = setup_google_sheet(
-            google_sheet_info["credentials_file"],
-            google_sheet_info["spreadsheet_id"],
-            google_sheet_info["input_sheet_name"]
-        )
-        # Setup Output Sheet
-        output_sheet = setup_google_sheet(
+        # Setup Input and Output Sheets
+        input_sheet, output_sheet = setup_google_sheets(
             google_sheet_info["credentials_file"],
             google_sheet_info["spreadsheet_id"],
+            google_sheet_info["input_sheet_name"],
             google_sheet_info["output_sheet_name"]
         )
         
-        # Assume the first row is headers
-        records = input_sheet.get_all_records()
+        # Assume the first row is headers, followed by the Learning Objective,
+        # Substandards and Key Phrases columns in that order
+        records = input_sheet.get(INPUT_SHEET_RANGE, value_render_option="UNFORMATTED_VALUE")
 
-        # Initialize lists
-        learning_objectives = []
-        substandards = []
-        key_phrases = []
+        # Initialize list
+        objectives = []
 
         # Parse each record
         for idx, record in enumerate(records, start=1):
             try:
-                learning_objective = record["Learning Objective"]
-                substandard = json.loads(record["Substandards"])
-                key_phrase = json.loads(record["Key Phrases"])
-
-                learning_objectives.append(learning_objective)
-                substandards.append(substandard)
-                key_phrases.append(key_phrase)
-            except json.JSONDecodeError as json_err:
+                # Trailing empty cells are omitted from the response, so pad short rows
+                learning_objective, substandards_cell, key_phrases_cell = (list(record) + ["", "", ""])[:3]
+                substandard = orjson.loads(substandards_cell)
+                key_phrase = orjson.loads(key_phrases_cell)
+                if not is_string_list(substandard) or not is_string_list(key_phrase):
+                    logging.error(f"Substandards and Key Phrases must be lists of strings in record {idx}\nRecord Data: {record}")
+                    continue
+
+                objectives.append(Objective(
+                    learning_objective,
+                    substandard,
+                    key_phrase,
+                    to_json(substandard),
+                    to_json(key_phrase)
+                ))
+            except (orjson.JSONDecodeError, TypeError) as json_err:
                 logging.error(f"JSON decoding failed for record {idx}: {str(json_err)}\nRecord Data: {record}")
                 continue
-            except KeyError as key_err:
-                logging.error(f"Missing expected key in record {idx}: {str(key_err)}\nRecord Data: {record}")
-                continue
     else:
         logging.error("No Google Sheet information provided in the event data.")
-        learning_objectives = []
-        substandards = []
-        key_phrases = []
+        objectives = []
 
-    if not learning_objectives:
+    if not objectives:
         logging.warning("No learning objectives found to process.")
         return
 
@@ -313,63 +1012,25 @@ def orchestrator(event):
             logging.error(f"Failed to create output CSV file: {str(e)}")
             sys.exit(1)
 
-    # Setup multiprocessing
-    with multiprocessing.Manager() as manager:
-        lock = manager.Lock()
-        pool = multiprocessing.Pool(processes=7, maxtasksperchild=5)
-        
-        # Process objectives and write results
-        async_results = []
-        for idx, (learning_objective, substandard, key_phrase) in enumerate(zip(
-            learning_objectives, substandards, key_phrases
-        ), start=1):
-            if not learning_objective:
-                logging.warning(f"Encountered empty Learning Objective at index {idx}. Skipping...")
-                continue
-            result = pool.apply_async(
-                process_objective, 
-                args=(
-                    event, 
-                    output_path, 
-                    headers, 
-                    lock, 
-                    learning_objective, 
-                    substandard, 
-                    key_phrase
-                )
-            )
-            async_results.append(result)
-        
-        # Wait for all processes to complete
-        for result in async_results:
-            try:
-                result.get()  # This ensures we catch any exceptions in the child processes
-            except Exception as e:
-                logging.error(f"An error occurred during multiprocessing: {str(e)}")
-        
-        pool.close()
-        pool.join()
-    
-    # After processing, write results to Google Sheet
-    if google_sheet_info:
-        try:
-            logging.info("Reading mappings from CSV for Google Sheet update")
-            with open(output_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                rows = list(reader)
-            
-            logging.info("Appending results to the Output Sheet")
-            for row in rows:
-                output_sheet.append_row([
-                    row['Learning Objective'],
-                    row['Substandards'],
-                    row['Key Phrases'],
-                    row['Thinking'],
-                    row['Substandards to Key Phrases Mapping'],
-                    row['Number of Key Phrases'],
-                    row["Total Key Phrases Mapped"],
-                    row["All Key Phrases Mapped Unique?"]
-                ])
-            logging.info("Successfully wrote mappings to Google Sheet")
-        except Exception as e:
-            logging.error(f"Failed to write to Google Sheet: {str(e)}")
+    # Process objectives concurrently
+    valid_objectives = []
+    for idx, objective in enumerate(objectives, start=1):
+        if not objective.learning_objective:
+            logging.warning(f"Encountered empty Learning Objective at index {idx}. Skipping...")
+            continue
+        valid_objectives.append(objective)
+
+    # Reuse mappings from previous runs unless the cache is disabled. Mappings sampled
+    # above temperature 0 are expected to vary between runs, so they are never cached
+    cache_file = event.get("cache_file", os.path.join(output_folder, "mapping-cache.sqlite3"))
+    if cache_file and event.get("temperature") != 0:
+        logging.info("Temperature is not 0, so the mapping cache is not used")
+        cache_file = None
+    cache = open_mapping_cache(cache_file) if cache_file else None
+
+    # Results are appended to the Output Sheet as they complete
+    try:
+        asyncio.run(process_objectives(event, output_path, valid_objectives, output_sheet, cache))
+    finally:
+        if cache is not None:
+            cache.close()
@@ -12,6 +12,10 @@ event = {
     "claude_api_key": "--your api-key--",
     "model": "claude-3-5-sonnet-20241022",
     "temperature": 0,
+    "batch_mode": False,
+    "requests_per_minute": 40,
+    "max_concurrent_requests": 10,
+    "objectives_per_request": 1,
     "google_sheet": {
         "credentials_file": "--your service account credentials json file--",
         "spreadsheet_id": "--your spreadsheet id--",